@@ -7,26 +7,148 @@ Note: For proper naming style, consider renaming this file to
 """
 
 import argparse
+import functools
+import hashlib
 import logging
 import os
+import shutil
+import sqlite3
+import threading
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.message import Message
+from typing import Iterable, Iterator, Optional, Tuple
 
-from urllib.parse import quote, unquote
+from urllib.parse import unquote
 
+import orjson
 import requests
-from fuzzywuzzy import fuzz
-from mutagen.mp3 import MP3
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rapidfuzz import fuzz, process
+from mutagen.mp3 import MP3, MPEGInfo
 from mutagen._util import MutagenError
 
+DEFAULT_WORKERS: int = 4
+_INVALID_FILENAME_CHARS = str.maketrans({c: "_" for c in '<>:"/\\|?*'})
+
+
+def sanitize_filename(filename: str) -> str:
+    """
+    Replace characters that are not allowed in file names with "_".
+
+    :param filename: Raw file name, e.g. from Content-Disposition.
+    :return: File name safe to use on common file systems.
+    """
+    return filename.translate(_INVALID_FILENAME_CHARS)
+
+
+def parse_filename(content_disposition: str) -> Optional[str]:
+    """
+    Extract the file name from a Content-Disposition header value.
+
+    Handles both plain ``filename="..."`` and RFC 5987/2231
+    ``filename*=UTF-8''...`` parameters.
+
+    :param content_disposition: Raw Content-Disposition header value.
+    :return: Decoded file name or None if the header carries none.
+    """
+    if not content_disposition:
+        return None
+    msg = Message()
+    msg["Content-Disposition"] = content_disposition
+    filename = msg.get_filename()
+    return unquote(filename) if filename else None
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that, on average, at most ``rate_per_sec`` of them
+    start per second. Unlike a fixed sleep after every call, time spent
+    inside a slow call counts towards the wait for the next one.
+    """
+
+    def __init__(self, rate_per_sec: float) -> None:
+        """
+        :param rate_per_sec: Allowed calls per second. A non-positive
+                             rate disables limiting.
+        """
+        self.interval = 1 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_delay(cls, delay: float) -> "RateLimiter":
+        """
+        Build a limiter allowing one call every ``delay`` seconds.
+        """
+        return cls(1 / delay if delay > 0 else 0)
+
+    def acquire(self) -> None:
+        """
+        Block until the next call is allowed to start.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next_allowed - now)
+            self._next_allowed = max(now, self._next_allowed) + self.interval
+        if wait:
+            time.sleep(wait)
+
+
+class TrackCache:
+    """
+    SQLite-backed map from track names to the stream URL that replaced
+    them, persisted across runs.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: Path of the SQLite database file.
+        """
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS known "
+            "(key TEXT PRIMARY KEY, url TEXT, ts INTEGER)"
+        )
+
+    @staticmethod
+    def _key(track_name: str) -> str:
+        return hashlib.blake2b(
+            track_name.lower().encode(), digest_size=16
+        ).hexdigest()
+
+    def get(self, track_name: str) -> Optional[str]:
+        """
+        :param track_name: Track name (usually "Artist - Title").
+        :return: Stored URL for the track or None if unknown.
+        """
+        row = self._conn.execute(
+            "SELECT url FROM known WHERE key = ?", (self._key(track_name),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """
+        :param items: (track name, URL) pairs to store.
+        """
+        now = int(time.time())
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO known (key, url, ts) VALUES (?, ?, ?)",
+                ((self._key(name), url, now) for name, url in items),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
 
 class SpotifyClient:
     """
     A client to search for Spotify tracks and download them via API.
     """
-    SEARCH_URL_TEMPLATE: str = (
-        "https://music.yeralin.net/search/spotify?q={}"
-    )
+    SEARCH_URL: str = "https://music.yeralin.net/search/spotify"
     STREAM_URL_TEMPLATE: str = (
         "https://music.yeralin.net/stream/spotify?trackId={}&download=true"
     )
@@ -35,12 +157,45 @@ class SpotifyClient:
     }
     FUZZY_MATCH_THRESHOLD: int = 80
 
-    def __init__(self, session: Optional[requests.Session] = None) -> None:
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        pool_size: int = 16,
+    ) -> None:
         """
         Initialize the Spotify client with an optional requests.Session
         for connection reuse.
+
+        :param session: Session to use as-is instead of a pooled default.
+        :param pool_size: Connections kept alive per host by the default
+                          session; should be at least the worker count.
         """
-        self.session = session if session is not None else requests.Session()
+        if session is None:
+            session = requests.Session()
+            # One pooled adapter for the whole run keeps TLS connections
+            # alive across searches and downloads.
+            # Rate limiting (429) and transient server errors are retried with
+            # exponential backoff, honouring Retry-After when present.
+            adapter = HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=pool_size,
+                max_retries=Retry(
+                    total=5,
+                    backoff_factor=1.0,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=["GET"],
+                ),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        session.headers.update(self.AUTH_HEADERS)
+        self.session = session
+        # Duplicate files and repeated names in a library resolve to the
+        # same search, so remember results for the lifetime of the client.
+        # Failed requests raise and are therefore not cached.
+        self._search_spotify = functools.lru_cache(maxsize=4096)(
+            self._search_spotify
+        )
 
     def search_spotify(self, track_name: str) -> Optional[str]:
         """
@@ -49,56 +204,71 @@ class SpotifyClient:
         :param track_name: Track name (usually "Artist - Title")
         :return: URL of the best matching track or None if not found.
         """
-        search_url = self.SEARCH_URL_TEMPLATE.format(quote(track_name))
         try:
-            response = self.session.get(
-                search_url, headers=self.AUTH_HEADERS, timeout=10
-            )
-            response.raise_for_status()
+            return self._search_spotify(track_name)
         except requests.RequestException as exc:
             logging.error(
                 "HTTP error when searching for track '%s': %s",
                 track_name,
                 exc,
             )
-            return None
-
-        try:
-            data = response.json()
-        except ValueError as exc:
+        except orjson.JSONDecodeError as exc:
             logging.error(
                 "Error decoding JSON for track '%s': %s", track_name, exc
             )
-            return None
+        return None
+
+    def _search_spotify(self, track_name: str) -> Optional[str]:
+        """
+        Uncached search; raises on transport and decoding errors.
+
+        :param track_name: Track name (usually "Artist - Title")
+        :return: URL of the best matching track or None if not found.
+        """
+        response = self.session.get(
+            self.SEARCH_URL,
+            params={"q": track_name},
+            timeout=10,
+        )
+        response.raise_for_status()
+        data = orjson.loads(response.content)
 
         if not data:
             logging.warning("No search results for track '%s'.", track_name)
             return None
 
-        # Compute fuzzy matching scores.
-        for entry in data:
-            title = entry.get("title", "")
-            entry["match_score"] = fuzz.ratio(
-                title.lower(), track_name.lower()
-            )
-
-        best_match = max(data, key=lambda x: x.get("match_score", 0), default={})
-        match_score = best_match.get("match_score", 0)
-        if match_score >= self.FUZZY_MATCH_THRESHOLD:
-            logging.info(
-                "Best match for '%s' is '%s' with score %d",
-                track_name,
-                best_match,
-                match_score,
-            )
-            return best_match.get("url")
+        # Normalize once up front; processor=None keeps RapidFuzz from
+        # re-processing every string on each comparison.
+        query = track_name.lower()
+        titles = [e.get("title", "").lower() for e in data]
+        if query in titles:
+            # Exact title match: no need to run the fuzzy scorer at all.
+            match_score, index = 100, titles.index(query)
         else:
-            logging.info(
-                "No sufficient match for '%s'. Best score was %d",
-                track_name,
-                match_score,
+            best = process.extractOne(
+                query,
+                titles,
+                scorer=fuzz.ratio,
+                processor=None,
+                score_cutoff=self.FUZZY_MATCH_THRESHOLD,
             )
-            return None
+            if best is None:
+                logging.info(
+                    "No sufficient match for '%s' (threshold %d)",
+                    track_name,
+                    self.FUZZY_MATCH_THRESHOLD,
+                )
+                return None
+            _, match_score, index = best
+
+        best_match = data[index]
+        logging.info(
+            "Best match for '%s' is '%s' with score %d",
+            track_name,
+            best_match,
+            match_score,
+        )
+        return best_match.get("url")
 
     def download_spotify_track(
         self, track_url: str, file_path: Optional[str] = None
@@ -108,13 +278,16 @@ class SpotifyClient:
 
         :param track_url: URL from search_spotify or constructed from a file.
         :param file_path: Target file path where the track should be saved.
-                          If provided, the old file is removed before saving.
+                          If provided, the old file is replaced once the
+                          new one has been downloaded completely.
         :return: True if download succeeds; False otherwise.
         """
         download_url = f"{track_url}&download=true"
         try:
             response = self.session.get(
-                download_url, headers=self.AUTH_HEADERS, timeout=20
+                download_url,
+                timeout=20,
+                stream=True,
             )
             response.raise_for_status()
         except requests.RequestException as exc:
@@ -125,56 +298,180 @@ class SpotifyClient:
             )
             return False
 
-        if response.status_code in (200, 206):
-            content_disp = response.headers.get("Content-Disposition", "")
-            if "filename=" in content_disp:
-                filename = unquote(
-                    content_disp.split("filename=")[-1].strip('"')
+        with response:
+            if response.status_code in (200, 206):
+                filename = parse_filename(
+                    response.headers.get("Content-Disposition", "")
                 )
-                for char in '<>:"/\\|?*':
-                    filename = filename.replace(char, "_")
-                if file_path:
-                    dirname = os.path.dirname(file_path)
+                old_path = None
+                if filename:
+                    filename = sanitize_filename(filename)
+                    if file_path:
+                        old_path = file_path
+                        file_path = os.path.join(
+                            os.path.dirname(file_path), filename
+                        )
+                    else:
+                        file_path = filename
+                else:
+                    file_path = f"download_{int(time.time())}.mp3"
+
+                # Download next to the target and swap it in atomically, so a
+                # failed transfer never costs us the track we already have.
+                part_path = f"{file_path}.part"
+                try:
+                    # Write the body as it arrives instead of buffering the
+                    # whole track in memory first.
+                    response.raw.decode_content = True
+                    with open(part_path, "wb") as f:
+                        shutil.copyfileobj(response.raw, f, length=1 << 20)
+                    os.replace(part_path, file_path)
+                except (OSError, urllib3.exceptions.HTTPError) as exc:
+                    logging.error(
+                        "Error writing file '%s': %s", file_path, exc
+                    )
+                    try:
+                        os.remove(part_path)
+                    except OSError:
+                        pass
+                    return False
+
+                if old_path and old_path != file_path:
                     try:
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
+                        os.remove(old_path)
                     except OSError as exc:
                         logging.error(
-                            "Error removing file %s: %s", file_path, exc
+                            "Error removing file %s: %s", old_path, exc
                         )
-                    file_path = os.path.join(dirname, filename)
-                else:
-                    file_path = filename
-            else:
-                file_path = f"download_{int(time.time())}.mp3"
-
-            try:
-                with open(file_path, "wb") as f:
-                    f.write(response.content)
                 logging.info("Downloaded track to '%s'", file_path)
                 return True
-            except OSError as exc:
+            elif response.status_code == 400:
                 logging.error(
-                    "Error writing file '%s': %s", file_path, exc
+                    "Spotify track ID not found for URL '%s' (HTTP 400)",
+                    track_url,
                 )
                 return False
-        elif response.status_code == 400:
-            logging.error(
-                "Spotify track ID not found for URL '%s' (HTTP 400)",
-                track_url,
-            )
-            return False
-        else:
+            else:
+                logging.error(
+                    "Failed to download track from '%s'. HTTP status: %d",
+                    track_url,
+                    response.status_code,
+                )
+                return False
+
+
+def iter_mp3_files(directory: str) -> Iterator[os.DirEntry]:
+    """
+    Recursively yield the MP3 files below a directory.
+
+    os.scandir serves the file/directory checks from the directory listing
+    itself, so no extra stat call is needed per entry. Unreadable
+    directories are logged and skipped, as os.walk would skip them.
+
+    :param directory: Directory to search.
+    :return: Iterator of directory entries for the MP3 files.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from iter_mp3_files(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(".mp3"):
+                    yield entry
+    except OSError as exc:
+        logging.error("Failed to list directory '%s': %s", directory, exc)
+
+
+def read_bitrate(filepath: str) -> int:
+    """
+    Read the bitrate of an MP3 file from its MPEG frame header alone.
+
+    ID3v2 tags are skipped over instead of being decoded, which is much
+    cheaper than a full MP3() load for files that turn out to be fine.
+
+    :param filepath: Path of the MP3 file.
+    :return: Bitrate in kbps.
+    """
+    with open(filepath, "rb") as f:
+        return MPEGInfo(f).bitrate // 1000
+
+
+def probe_track(entry: os.DirEntry) -> Optional[Tuple[str, str]]:
+    """
+    Check whether a local MP3 file should be replaced by a better version.
+
+    :param entry: Directory entry of the MP3 file.
+    :return: (track name, file path) if the bitrate is below 320 kbps;
+             None if the file is fine or could not be read.
+    """
+    file = entry.name
+    filepath = entry.path
+    try:
+        bitrate = read_bitrate(filepath)
+    except (OSError, MutagenError) as exc:
+        logging.error("Failed to read MP3 file '%s': %s", filepath, exc)
+        return None
+
+    if bitrate >= 320:
+        logging.info("Track '%s' has acceptable bitrate (%dkbps)", file, bitrate)
+        return None
+
+    # Tags are only needed for tracks we are about to replace.
+    try:
+        audio = MP3(filepath)
+    except MutagenError as exc:
+        logging.error("Failed to read MP3 file '%s': %s", filepath, exc)
+        return None
+    if audio.tags and "TPE1" in audio.tags and "TIT2" in audio.tags:
+        try:
+            artist = audio.tags["TPE1"].text[0]
+            title = audio.tags["TIT2"].text[0]
+            track_name = f"{artist} - {title}"
+        except (IndexError, AttributeError) as exc:
             logging.error(
-                "Failed to download track from '%s'. HTTP status: %d",
-                track_url,
-                response.status_code,
+                "Error extracting metadata from '%s': %s", filepath, exc
             )
-            return False
+            track_name = os.path.splitext(file)[0]
+    else:
+        track_name = os.path.splitext(file)[0]
+
+    logging.info(
+        "Track '%s' has bitrate %dkbps. Processing...", track_name, bitrate
+    )
+    return track_name, filepath
+
+
+def enhance_track(
+    spotify_client: SpotifyClient,
+    track_name: str,
+    track_url: str,
+    filepath: str,
+    limiter: RateLimiter,
+) -> bool:
+    """
+    Replace a local file with the high-quality version of the track.
+
+    :param spotify_client: An instance of SpotifyClient.
+    :param track_name: Track name (usually "Artist - Title").
+    :param track_url: URL of the matching track from search_spotify.
+    :param filepath: Path of the local MP3 file to replace.
+    :param limiter: Rate limiter shared by all downloads.
+    :return: True if the track was replaced; False otherwise.
+    """
+    limiter.acquire()
+    if spotify_client.download_spotify_track(track_url, filepath):
+        logging.info("Successfully processed track '%s'", track_name)
+        return True
+    logging.error("Failed to download improved version for '%s'", track_name)
+    return False
 
 
 def process_tracks(
-    spotify_client: SpotifyClient, tracks_dir: str = ".", delay: int = 60
+    spotify_client: SpotifyClient,
+    tracks_dir: str = ".",
+    delay: int = 60,
+    workers: int = DEFAULT_WORKERS,
+    cache_db: Optional[str] = None,
 ) -> None:
     """
     Process all MP3 tracks in the given directory. For tracks with a bitrate
@@ -182,97 +479,132 @@ def process_tracks(
 
     :param spotify_client: An instance of SpotifyClient.
     :param tracks_dir: Directory containing MP3 files.
-    :param delay: Seconds to wait between downloads.
+    :param delay: Minimum average seconds between downloads.
+    :param workers: Number of searches and downloads run concurrently.
+    :param cache_db: Optional SQLite file remembering the URLs of tracks
+                     processed in earlier runs, so they are not searched
+                     again.
     """
-    for root, _, files in os.walk(tracks_dir):
-        for file in files:
-            if file.lower().endswith(".mp3"):
-                filepath = os.path.join(root, file)
-                try:
-                    audio = MP3(filepath)
-                except MutagenError as exc:
-                    logging.error(
-                        "Failed to read MP3 file '%s': %s", filepath, exc
-                    )
-                    continue
+    # First pass: probe all files in parallel, since reading headers and
+    # tags is bound by disk latency rather than CPU.
+    entries = list(iter_mp3_files(tracks_dir))
+    with ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 2) as executor:
+        pending = [p for p in executor.map(probe_track, entries) if p]
 
-                # Use getattr to safely retrieve bitrate.
-                bitrate = (
-                    getattr(audio.info, "bitrate", 0) // 1000
-                    if audio.info
-                    else 0
-                )
-                if bitrate < 320:
-                    if audio.tags and "TPE1" in audio.tags and "TIT2" in audio.tags:
-                        try:
-                            artist = audio.tags["TPE1"].text[0]
-                            title = audio.tags["TIT2"].text[0]
-                            track_name = f"{artist} - {title}"
-                        except (IndexError, AttributeError) as exc:
-                            logging.error(
-                                "Error extracting metadata from '%s': %s",
-                                filepath,
-                                exc,
-                            )
-                            track_name = os.path.splitext(file)[0]
-                    else:
-                        track_name = os.path.splitext(file)[0]
+    if not pending:
+        return
 
-                    logging.info(
-                        "Track '%s' has bitrate %dkbps. Processing...",
-                        track_name,
-                        bitrate,
-                    )
-                    track_url = spotify_client.search_spotify(track_name)
-                    if track_url:
-                        if spotify_client.download_spotify_track(track_url, filepath):
-                            logging.info(
-                                "Successfully processed track '%s'", track_name
-                            )
-                        else:
-                            logging.error(
-                                "Failed to download improved version for '%s'",
-                                track_name,
-                            )
-                        time.sleep(delay)
-                    else:
-                        logging.warning(
-                            "Spotify track not found for '%s'", track_name
-                        )
+    cache = TrackCache(cache_db) if cache_db else None
+    try:
+        known = {}
+        if cache is not None:
+            for track_name, _ in pending:
+                track_url = cache.get(track_name)
+                if track_url:
+                    known[track_name] = track_url
+        to_search = [name for name, _ in pending if name not in known]
+
+        limiter = RateLimiter.from_delay(delay)
+        downloads = {}
+        succeeded = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Second pass: run all searches concurrently.
+            found = executor.map(spotify_client.search_spotify, to_search)
+            # Third pass: download the matches as their searches complete.
+            for track_name, filepath in pending:
+                if track_name in known:
+                    track_url = known[track_name]
+                    logging.info("Using cached URL for '%s'", track_name)
                 else:
-                    logging.info(
-                        "Track '%s' has acceptable bitrate (%dkbps)",
-                        file,
-                        bitrate,
+                    track_url = next(found)
+                if not track_url:
+                    logging.warning(
+                        "Spotify track not found for '%s'", track_name
                     )
+                    continue
+                future = executor.submit(
+                    enhance_track,
+                    spotify_client,
+                    track_name,
+                    track_url,
+                    filepath,
+                    limiter,
+                )
+                downloads[future] = (track_name, track_url)
+            for future in as_completed(downloads):
+                track_name, track_url = downloads[future]
+                try:
+                    if future.result():
+                        succeeded.append((track_name, track_url))
+                except Exception:
+                    logging.exception(
+                        "Unexpected error while processing track '%s'", track_name
+                    )
+
+        if cache is not None:
+            cache.put_many(succeeded)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def download_song(
+    spotify_client: SpotifyClient, track_url: str, limiter: RateLimiter
+) -> None:
+    """
+    Download a single track once the rate limiter allows it.
+
+    :param spotify_client: An instance of SpotifyClient.
+    :param track_url: Stream URL of the track to download.
+    :param limiter: Rate limiter shared by all downloads.
+    """
+    limiter.acquire()
+    if spotify_client.download_spotify_track(track_url):
+        logging.info("Downloaded track from '%s'", track_url)
+    else:
+        logging.error("Failed to download track from '%s'", track_url)
 
 
 def process_songs_file(
-    spotify_client: SpotifyClient, songs_file: str = "songs.txt", delay: int = 20
+    spotify_client: SpotifyClient,
+    songs_file: str = "songs.txt",
+    delay: int = 20,
+    workers: int = DEFAULT_WORKERS,
 ) -> None:
     """
     Process a file containing Spotify track URLs and download each track.
 
     :param spotify_client: An instance of SpotifyClient.
     :param songs_file: Path to the file with Spotify track URLs.
-    :param delay: Seconds to wait between downloads.
+    :param delay: Minimum average seconds between downloads.
+    :param workers: Number of tracks downloaded concurrently.
     """
     if not os.path.exists(songs_file):
         logging.error("Songs file '%s' does not exist.", songs_file)
         return
 
-    with open(songs_file, "r", encoding="utf-8") as file:
+    limiter = RateLimiter.from_delay(delay)
+    downloads = {}
+    with open(songs_file, "r", encoding="utf-8") as file, ThreadPoolExecutor(
+        max_workers=workers
+    ) as executor:
         for line in file:
             track_id = line.strip()
             if "spotify.com" in track_id:
                 track_url = SpotifyClient.STREAM_URL_TEMPLATE.format(track_id)
-                if spotify_client.download_spotify_track(track_url):
-                    logging.info("Downloaded track from '%s'", track_url)
-                else:
-                    logging.error("Failed to download track from '%s'", track_url)
-                time.sleep(delay)
+                future = executor.submit(
+                    download_song, spotify_client, track_url, limiter
+                )
+                downloads[future] = track_url
             else:
                 logging.warning("Invalid track URL: '%s'", track_id)
+        for future in as_completed(downloads):
+            try:
+                future.result()
+            except Exception:
+                logging.exception(
+                    "Unexpected error while downloading '%s'", downloads[future]
+                )
 
 
 def main() -> None:
@@ -301,11 +633,28 @@ def main() -> None:
     parser.add_argument(
         "--delay",
         help=(
-            "Delay between downloads in seconds "
+            "Minimum average delay between downloads in seconds "
             "(default: 60 for directory, 20 for songs file)"
         ),
         type=int,
     )
+    parser.add_argument(
+        "--workers",
+        help=(
+            "Number of tracks downloaded concurrently "
+            f"(default: {DEFAULT_WORKERS})"
+        ),
+        default=DEFAULT_WORKERS,
+        type=int,
+    )
+    parser.add_argument(
+        "--cache-db",
+        help=(
+            "SQLite file remembering matched URLs of processed tracks, "
+            "so later runs skip searching for them (directory mode only)"
+        ),
+        type=str,
+    )
     parser.add_argument(
         "--log-level",
         help=(
@@ -325,14 +674,25 @@ def main() -> None:
         format="%(asctime)s - %(levelname)s - %(message)s",
     )
 
-    spotify_client = SpotifyClient()
+    spotify_client = SpotifyClient(pool_size=max(args.workers, 16))
 
     if args.directory:
         delay = args.delay if args.delay is not None else 60
-        process_tracks(spotify_client, tracks_dir=args.directory, delay=delay)
+        process_tracks(
+            spotify_client,
+            tracks_dir=args.directory,
+            delay=delay,
+            workers=args.workers,
+            cache_db=args.cache_db,
+        )
     elif args.songs:
         delay = args.delay if args.delay is not None else 20
-        process_songs_file(spotify_client, songs_file=args.songs, delay=delay)
+        process_songs_file(
+            spotify_client,
+            songs_file=args.songs,
+            delay=delay,
+            workers=args.workers,
+        )
 
 
 if __name__ == "__main__":
@@ -1,25 +1,62 @@
+import hmac
 from os import getenv
+from threading import Lock
 from urllib.parse import quote
 
+from cachetools import TTLCache
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
 from flask import Flask, Response, jsonify, request, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_httpauth import HTTPBasicAuth
 
 from models import Version
-from streamers.exceptions import StreamerError
+from streamers import utils
+from streamers.exceptions import RangeNotSatisfiableError, StreamerError
 from streamers.spotify import SpotifyStreamer
 
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider backed by orjson, which also serializes the dataclass models natively.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.url_map.strict_slashes = False
 auth = HTTPBasicAuth()
+# Credentials are read once at startup
+auth_username, auth_password = (
+    value.encode() if value is not None else None
+    for value in (getenv("USERNAME"), getenv("PASSWORD"))
+)
 spotify_streamer = SpotifyStreamer()
+# Clients re-issue the same search while the user types
+search_cache = TTLCache(maxsize=2048, ttl=120)
+search_cache_lock = Lock()
 
 
 @auth.verify_password
 def verify_password(username, password):
-    return username == getenv("USERNAME") and password == getenv("PASSWORD")
+    if auth_username is None or auth_password is None:
+        return False
+    # Constant-time compares; "&" so both are always evaluated
+    return hmac.compare_digest(
+        (username or "").encode(), auth_username
+    ) & hmac.compare_digest((password or "").encode(), auth_password)
 
 
 @app.route("/version", methods=["GET"])
@@ -34,7 +71,14 @@ def search_spotify():
     limit = int(request.args.get("limit", 20))
     if not search_query:
         return "Missing 'q' query param", 400
-    results = spotify_streamer.search(query=search_query, limit=limit)
+    # Result URLs embed the request host, so it is part of the key.
+    key = (request.path, request.host, search_query, limit)
+    with search_cache_lock:
+        results = search_cache.get(key)
+    if results is None:
+        results = spotify_streamer.search(query=search_query, limit=limit)
+        with search_cache_lock:
+            search_cache[key] = results
     return jsonify(results)
 
 
@@ -49,23 +93,43 @@ def stream_spotify():
     try:
         if range_header:
             range_start, range_end = range_header.replace("bytes=", "").split("-")
-            range_start = int(range_start) if range_start else 0
-            range_end = int(range_end) if range_end else None
+            if not range_start:
+                # Suffix range: the last N bytes, passed on as a negative start
+                if not range_end or int(range_end) == 0:
+                    return "Requested range not satisfiable", 416
+                range_start, range_end = -int(range_end), None
+            else:
+                range_start = int(range_start)
+                # The header's end is inclusive; ranges are [start, end) from here on
+                range_end = int(range_end) + 1 if range_end else None
         else:
             range_start, range_end = (0, None)
-        stream, title, duration, size = spotify_streamer.request_stream(
-            track_id, range_start, range_end
-        )
-        if not range_end:
-            range_end = size
+        # Clients preferring Vorbis get the file untranscoded; MP3 wins ties
+        # (and */* or no Accept at all)
+        ogg = request.accept_mimetypes.best_match(["audio/mpeg", "audio/ogg"]) == "audio/ogg"
+        if ogg:
+            stream, title, duration, size = spotify_streamer.request_stream_ogg(
+                track_id, range_start, range_end
+            )
+        else:
+            # GET loads the track up front so failures still get a 400
+            stream, title, duration, size = spotify_streamer.request_stream(
+                track_id, range_start, range_end,
+                defer_load=request.method == "HEAD",
+            )
+        extension = "ogg" if ogg else "mp3"
+        range_start, range_end = utils.resolve_range(range_start, range_end, size)
         headers = {
             "Content-Range": f"bytes {range_start}-{range_end - 1}/{size}",
             "Content-Length": str(range_end - range_start),
             "Accept-Ranges": "bytes",
-            "Content-Type": "audio/mp3",
-            "Content-Disposition": f'{"attachment" if download else "inline"}; filename="{quote(title)}.mp3"',
+            "Content-Type": f"audio/{extension}",
+            "Content-Disposition": f'{"attachment" if download else "inline"}; filename="{quote(title)}.{extension}"',
             "Audio-Duration": str(duration),  # Custom header
+            "Vary": "Accept",
         }
+    except RangeNotSatisfiableError as e:
+        return str(e), 416, {"Content-Range": f"bytes */{e.size}"}
     except StreamerError as e:
         return str(e), 400
     return Response(
@@ -61,7 +61,7 @@ class BaseStreamer(ABC):
 
         Args:
             track_id (str): The unique identifier for the track.
-            range_start (int): The starting byte position of the stream.
+            range_start (int): The starting byte position of the stream. Negative for the last -range_start bytes.
             range_end (Optional[int]): The ending byte position of the stream. None for no end limit.
 
         Returns:
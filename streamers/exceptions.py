@@ -1,3 +1,8 @@
-
 class StreamerError(Exception):
     pass
+
+
+class RangeNotSatisfiableError(StreamerError):
+    def __init__(self, size: int) -> None:
+        super().__init__("Requested range not satisfiable")
+        self.size = size
@@ -1,17 +1,26 @@
 """This module provides functionality for streaming Spotify tracks using the Spotify API and librespot."""
+import json
 import re
 from io import BytesIO
+import os
 from os import getenv
+import selectors
+import socket
 import subprocess
+import tempfile
 import threading
-from typing import Generator, List, Optional, Tuple
+import time
+from typing import Callable, Dict, Generator, Iterator, List, Optional, Set, Tuple
+import weakref
 
 import spotipy
+from cachetools import TTLCache, cachedmethod
 from librespot.audio import PlayableContentFeeder
 from librespot.audio.decoders import AudioQuality, VorbisOnlyAudioQuality
 from librespot.proto.Metadata_pb2 import AudioFile
 from librespot.core import Session
 from librespot.metadata import TrackId
+from spotipy.cache_handler import MemoryCacheHandler
 from spotipy.oauth2 import SpotifyClientCredentials
 
 from models import Entry
@@ -19,6 +28,74 @@ from streamers import utils
 from streamers.base_streamer import BaseStreamer
 from streamers.exceptions import StreamerError
 
+# Bitrate (kbps) used for each Spotify audio file format
+BITRATES = {
+    AudioFile.MP3_96: 96,
+    AudioFile.OGG_VORBIS_96: 96,
+    AudioFile.AAC_24_NORM: 96,
+    AudioFile.MP3_160: 160,
+    AudioFile.MP3_160_ENC: 160,
+    AudioFile.OGG_VORBIS_160: 160,
+    AudioFile.AAC_24: 160,
+    AudioFile.MP3_320: 320,
+    AudioFile.MP3_256: 320,
+    AudioFile.OGG_VORBIS_320: 320,
+    AudioFile.AAC_48: 320,
+}
+# Spotify's own header in front of the first OggS page; librespot skips it
+# when loading, and clients must never see it
+SPOTIFY_OGG_HEADER_SIZE = 0xA7
+# Padding source for MP3 output that falls short of the estimated size
+ZEROS = bytes(64 * 1024)
+# Smallest piece of transcoded output handed to the WSGI server at once
+MIN_YIELD_SIZE = 256 * 1024
+# Age (seconds) after which an untouched .part in the MP3 cache is abandoned
+MP3_CACHE_STALE_PART_AGE = 24 * 3600
+
+
+def _pump_ffmpeg(ffmpeg_process: subprocess.Popen, input_stream, chunk_size: int,
+                 read_size: int) -> Iterator[bytes]:
+    """
+    Yields FFmpeg output, feeding it input only while the consumer
+    keeps pulling: nothing is read from Spotify while we are parked
+    at a yield, so a slow or gone client throttles the whole pipeline
+    """
+    in_fd = ffmpeg_process.stdin.fileno()
+    out_fd = ffmpeg_process.stdout.fileno()
+    os.set_blocking(in_fd, False)
+    with selectors.DefaultSelector() as selector:
+        selector.register(in_fd, selectors.EVENT_WRITE)
+        selector.register(out_fd, selectors.EVENT_READ)
+        pending = b''
+        buffer = bytearray()
+        while True:
+            for key, _ in selector.select():
+                if key.fd == in_fd:
+                    if not pending:
+                        pending = input_stream.read(chunk_size)
+                    try:
+                        if not pending:
+                            raise BrokenPipeError  # End of input
+                        pending = pending[os.write(in_fd, pending):]
+                    except BlockingIOError:
+                        pass
+                    except BrokenPipeError:
+                        selector.unregister(in_fd)
+                        ffmpeg_process.stdin.close()
+                    continue
+                # Raw read on the FD, skipping the BufferedReader copy
+                out_chunk = os.read(out_fd, read_size)
+                if not out_chunk:
+                    if buffer:
+                        yield bytes(buffer)
+                    return
+                # Pipe reads are often just a few KB; hand out bigger
+                # pieces so each WSGI write/chunk frame carries more
+                buffer += out_chunk
+                if len(buffer) >= MIN_YIELD_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+
 
 class SpotifyStreamer(BaseStreamer):
     """
@@ -28,27 +105,73 @@ class SpotifyStreamer(BaseStreamer):
     stream_path = "/stream/spotify"
     search_path = "/search/spotify"
     spotify_track_regex = r"([a-zA-Z0-9]{22})"
+    spotify_track_pattern = re.compile(spotify_track_regex)
+    session_refresh_interval = 50 * 60  # seconds between pre-warmed logins
 
     def __init__(
         self,
-        username: str = getenv("SPOTIFY_USERNAME"),
-        pwd: str = getenv("SPOTIFY_PASSWORD"),
-        client_id: str = getenv("SPOTIFY_CLIENT_ID"),
-        client_secret: str = getenv("SPOTIFY_CLIENT_SECRET"),
+        username: Optional[str] = None,
+        pwd: Optional[str] = None,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
         chunk_size: int = (128 * 1024),
+        read_size: int = (1024 * 1024),
+        mp3_cache_dir: Optional[str] = None,
+        mp3_cache_size: Optional[int] = None,
     ) -> None:
         super().__init__()
+        # Resolved per instance, not at import time, so a .env loaded after
+        # importing this module (or a changed environment) is still honored.
+        username = username or getenv("SPOTIFY_USERNAME")
+        pwd = pwd or getenv("SPOTIFY_PASSWORD")
+        client_id = client_id or getenv("SPOTIFY_CLIENT_ID")
+        client_secret = client_secret or getenv("SPOTIFY_CLIENT_SECRET")
+        # librespot reads stay at its own 128 KiB chunk size: read(n) works out
+        # the last chunk from n alone, so bigger reads can run past the file.
+        # read_size is for local reads (FFmpeg's pipe, the MP3 cache).
         self.chunk_size = chunk_size
+        self.read_size = read_size
+        # Optional on-disk LRU of fully transcoded tracks (off by default)
+        self.mp3_cache_dir = mp3_cache_dir or getenv("MP3_CACHE_DIR")
+        self.mp3_cache_size = mp3_cache_size or int(
+            getenv("MP3_CACHE_SIZE", 20 * 1024 ** 3)
+        )
+        self._mp3_cache_lock = threading.Lock()
+        if self.mp3_cache_dir:
+            os.makedirs(self.mp3_cache_dir, exist_ok=True)
+            self._trim_mp3_cache()  # Sweep leftovers of a previous run
         self.session = Session.Builder().stored_file().create()
         self.content_feeder = self.session.content_feeder()
-        self.spotify_api = spotipy.Spotify(
-            auth_manager=SpotifyClientCredentials(
-                client_id=client_id, client_secret=client_secret
-            )
+        # Guards session/content_feeder swaps; the generation lets concurrent
+        # failing requests agree on a single swap per broken session.
+        self._session_lock = threading.RLock()
+        self._session_gen = 0
+        self._next_session: Optional[Session] = None
+        # Streams still reading from each session, and swapped-out sessions
+        # waiting for theirs to finish before they are closed
+        self._session_streams: Dict[Session, int] = {}
+        self._retired_sessions: Set[Session] = set()
+        threading.Thread(target=self._refresh_sessions, daemon=True).start()
+        # In-memory token cache: the default handler rewrites a .cache file
+        self._api_auth = SpotifyClientCredentials(
+            client_id=client_id,
+            client_secret=client_secret,
+            cache_handler=MemoryCacheHandler(),
         )
+        self.spotify_api = spotipy.Spotify(auth_manager=self._api_auth)
+        threading.Thread(target=self._refresh_api_token, daemon=True).start()
+        # Raw Web API search responses, keyed by (normalized query, limit)
+        self._search_cache = TTLCache(maxsize=4096, ttl=3600)
+        self._search_cache_lock = threading.Lock()
+        # (title, duration, bitrate, size) of recently resolved tracks
+        self._track_cache = TTLCache(maxsize=1024, ttl=600)
+        self._track_cache_lock = threading.Lock()
 
-    def parse_spotify_track_id(self, track_id: str) -> Optional[TrackId]:
-        match = re.search(self.spotify_track_regex, track_id)
+    def parse_spotify_track_id(self, track_id: str) -> Optional[str]:
+        # Fast path: clients usually send the bare 22-char base62 ID
+        if len(track_id) == 22 and track_id.isascii() and track_id.isalnum():
+            return track_id
+        match = self.spotify_track_pattern.search(track_id)
         if not match:
             return None
         return match.group()
@@ -57,149 +180,443 @@ class SpotifyStreamer(BaseStreamer):
         return "Spotify"
 
     def _extract_bitrate(self, audio_format: AudioFile.Format) -> int:
-        if audio_format in [
-                AudioFile.MP3_96,
-                AudioFile.OGG_VORBIS_96,
-                AudioFile.AAC_24_NORM,
-        ]:
-            return 96
-        if audio_format in [
-                AudioFile.MP3_160,
-                AudioFile.MP3_160_ENC,
-                AudioFile.OGG_VORBIS_160,
-                AudioFile.AAC_24,
-        ]:
-            return 160
-        if audio_format in [
-                AudioFile.MP3_320,
-                AudioFile.MP3_256,
-                AudioFile.OGG_VORBIS_320,
-                AudioFile.AAC_48,
-        ]:
-            return 320
-        raise RuntimeError("Unknown format: {}".format(format))
+        try:
+            return BITRATES[audio_format]
+        except KeyError:
+            raise RuntimeError(f"Unknown format: {audio_format!r}") from None
+
+    @cachedmethod(
+        lambda self: self._search_cache,
+        key=lambda self, query, limit=20: (query.lower(), limit),
+        lock=lambda self: self._search_cache_lock,
+    )
+    def _search_tracks(self, query: str, limit: int = 20) -> dict:
+        return self.spotify_api.search(q=query, limit=limit)
 
     def search(self, query: str, limit: int = 20) -> List[Entry]:
         results = []
-        search_output = self.spotify_api.search(q=query, limit=limit)
+        search_output = self._search_tracks(query, limit)
+        # Everything but the track ID is shared by all result URLs
+        base_url = utils.construct_url(self.stream_path, scheme="https", trackId="")
+        source = self.get_name()
         for item in search_output["tracks"]["items"]:
             # Construct title
-            artists = ", ".join([artist["name"] for artist in item["artists"]])
-            title = " - ".join([artists, item["name"]])
-            # Construct url
-            track_id = self.parse_spotify_track_id(item["uri"])
-            url = utils.construct_url(self.stream_path, scheme="https", trackId=track_id)
-            results.append(Entry(title, url, self.get_name()))
+            artists = ", ".join(artist["name"] for artist in item["artists"])
+            title = artists + " - " + item["name"]
+            # Construct url: uris are "spotify:track:<22-char ID>"
+            uri = item["uri"]
+            track_id = uri[14:] if len(uri) == 36 else self.parse_spotify_track_id(uri)
+            if not track_id:
+                continue  # Not a track we could stream
+            results.append(Entry(title, base_url + track_id, source))
         return results
 
     def request_stream(
-        self, track_id: str, range_start: int, range_end: Optional[int]
+        self, track_id: str, range_start: int, range_end: Optional[int],
+        defer_load: bool = False,
     ) -> Tuple[Generator[BytesIO, None, None], str, int, int]:
+        """
+        With defer_load, a track whose metadata is cached is only loaded once
+        the body is streamed; meant for HEAD, where it never is. Otherwise
+        loading errors surface here, before any response has been started.
+        The range is checked as soon as the size is known, so an
+        unsatisfiable one is refused without loading when possible.
+        """
         spotify_track_id = self.parse_spotify_track_id(track_id)
         if not spotify_track_id:
             raise StreamerError(
                 "Invalid trackId param, expected " + self.spotify_track_regex
             )
+        # Transcoded before: no librespot, no FFmpeg
+        cached = self._mp3_cache_lookup(spotify_track_id)
+        if cached is not None:
+            path, title, duration, size = cached
+            range_start, range_end = utils.resolve_range(range_start, range_end, size)
+            stream = self.generate_stream_file(path, range_start, range_end)
+            return (stream, title, duration, size)
         preferred_quality = VorbisOnlyAudioQuality(AudioQuality.VERY_HIGH) # AudioQuality.VERY_HIGH (320kbps) only on Spotify Premium
-        try:
-            playable_content = self.content_feeder.load(
-                TrackId.from_uri("spotify:track:" + spotify_track_id), preferred_quality, False, None
+        with self._track_cache_lock:
+            metadata = self._track_cache.get(spotify_track_id)
+        if metadata is None:
+            playable_content = self._load_content(spotify_track_id, preferred_quality)
+            preferred_file = preferred_quality.get_file(
+                playable_content.track.file)
+            # Get metadata
+            artists = ", ".join([artist.name for artist in playable_content.track.artist])
+            title = " - ".join([artists, playable_content.track.name])
+            duration = playable_content.track.duration // 1000  # ms to sec
+            bitrate = self._extract_bitrate(preferred_file.format)
+            # Full ms precision: truncating to seconds under-counts up to 40 KB
+            size = utils.estimate_size(playable_content.track.duration, bitrate)
+            with self._track_cache_lock:
+                self._track_cache[spotify_track_id] = (title, duration, bitrate, size)
+            range_start, range_end = utils.resolve_range(range_start, range_end, size)
+            load_content = lambda: playable_content
+        else:
+            title, duration, bitrate, size = metadata
+            range_start, range_end = utils.resolve_range(range_start, range_end, size)
+            if defer_load:
+                # Known track: headers can be answered without touching librespot
+                load_content = lambda: self._load_content(spotify_track_id, preferred_quality)
+            else:
+                playable_content = self._load_content(spotify_track_id, preferred_quality)
+                load_content = lambda: playable_content
+        cache_entry = (spotify_track_id, title, duration) if self.mp3_cache_dir else None
+        # Generate stream
+        stream = self.generate_stream(load_content, bitrate, size, range_start,
+                                      range_end, cache_entry)
+        return (stream, title, duration, size)
+
+    def request_stream_ogg(
+        self, track_id: str, range_start: int, range_end: Optional[int]
+    ) -> Tuple[Generator[BytesIO, None, None], str, int, int]:
+        """
+        Same as request_stream, but serves the original Ogg Vorbis file
+        untouched, so no transcoding and the real file size
+        """
+        spotify_track_id = self.parse_spotify_track_id(track_id)
+        if not spotify_track_id:
+            raise StreamerError(
+                "Invalid trackId param, expected " + self.spotify_track_regex
             )
-        except RuntimeError as e:
-            if str(e) == "Cannot get alternative track":
-                raise StreamerError(str(e)) from e
-            raise e
-        preferred_file = preferred_quality.get_file(
-            playable_content.track.file)
-        # Get metadata
+        preferred_quality = VorbisOnlyAudioQuality(AudioQuality.VERY_HIGH)
+        playable_content = self._load_content(spotify_track_id, preferred_quality)
         artists = ", ".join([artist.name for artist in playable_content.track.artist])
         title = " - ".join([artists, playable_content.track.name])
         duration = playable_content.track.duration // 1000  # ms to sec
-        bitrate = self._extract_bitrate(preferred_file.format)
-        size = utils.estimate_size(duration, bitrate)
-        # Generate stream
-        stream = self.generate_stream(playable_content, bitrate, size)
-        return (stream, title, duration, size)
-        """ Pass-through Ogg stream (not used)
+        size = playable_content.input_stream.size - SPOTIFY_OGG_HEADER_SIZE
+        range_start, range_end = utils.resolve_range(range_start, range_end, size)
         stream = self.generate_stream_ogg(playable_content, range_start, range_end)
-        return (stream, title, duration, playable_content.input_stream.size)
+        return (stream, title, duration, size)
+
+    def _refresh_sessions(self) -> None:
+        """
+        Logs in ahead of time so a failing request can swap to a warm
+        session instead of paying the login round-trip itself
         """
+        while True:
+            time.sleep(self.session_refresh_interval)
+            try:
+                session = Session.Builder().stored_file().create()
+            except Exception:
+                continue  # Try again next round; requests keep the old one
+            with self._session_lock:
+                stale, self._next_session = self._next_session, session
+            if stale is not None:
+                stale.close()
 
-    def generate_stream(self, payload: PlayableContentFeeder.LoadedStream,
-                        bitrate: int, size: int) -> Generator[BytesIO, None, None]:
+    def _refresh_api_token(self) -> None:
         """
-        Converts OGG to MP3 on the fly using FFMPEG
+        Renews the Web API token well before it expires, so the refresh
+        round-trip never lands on a search request
         """
-        
-        def async_write(ffmpeg_process, stream):
+        while True:
             try:
-                while True:
-                    in_chunk = stream.read(self.chunk_size)
-                    if not in_chunk:
-                        ffmpeg_process.stdin.close()
-                        stream.read(self.chunk_size)
+                # Forced: spotipy itself only renews within 60s of expiry,
+                # and by then a search may already have paid for it
+                self._api_auth.get_access_token(as_dict=False, check_cache=False)
+                token = self._api_auth.cache_handler.get_cached_token()
+                delay = token["expires_at"] - time.time() - 300
+            except Exception:
+                delay = 60  # Spotify unreachable; searches retry on their own
+            time.sleep(max(delay, 1))
+
+    def _swap_session(self, failed_gen: int) -> None:
+        with self._session_lock:
+            if self._session_gen != failed_gen:
+                return  # Another request already swapped it
+            session, self._next_session = self._next_session, None
+        if session is None:
+            # No warm session yet: log in without holding up other requests
+            session = Session.Builder().stored_file().create()
+        with self._session_lock:
+            if self._session_gen != failed_gen:
+                # Lost the race to another request; keep ours warm instead
+                session, self._next_session = self._next_session, session
+                retired = None
+            else:
+                retired, self.session = self.session, session
+                self.content_feeder = session.content_feeder()
+                self._session_gen += 1
+                session = None
+                if self._session_streams.get(retired):
+                    self._retired_sessions.add(retired)
+                    retired = None
+        for stale in (session, retired):
+            if stale is not None:
+                stale.close()
+
+    def _track_session_stream(
+        self, session: Session, payload: PlayableContentFeeder.LoadedStream
+    ) -> PlayableContentFeeder.LoadedStream:
+        """Counts payload against session until it is garbage collected"""
+        with self._session_lock:
+            self._session_streams[session] = self._session_streams.get(session, 0) + 1
+        weakref.finalize(payload, self._release_session_stream, session)
+        return payload
+
+    def _release_session_stream(self, session: Session) -> None:
+        with self._session_lock:
+            remaining = self._session_streams.pop(session, 1) - 1
+            if remaining:
+                self._session_streams[session] = remaining
+                return
+            if session not in self._retired_sessions:
+                return
+            self._retired_sessions.discard(session)
+        session.close()  # Swapped out and its last stream is done
+
+    @staticmethod
+    def _session_broken(session: Session, error: Exception) -> bool:
+        """Tells connection/auth failures apart from errors about the track"""
+        # Plain IOErrors are librespot's CDN status codes (and "Couldn't skip
+        # 0xa7 bytes!"): about this track, not the session
+        if isinstance(error, (ConnectionError, TimeoutError, socket.gaierror)):
+            return True
+        try:
+            return not session.is_valid()
+        except Exception:
+            return True
+
+    def _load_content(
+        self, spotify_track_id: str, quality: VorbisOnlyAudioQuality
+    ) -> PlayableContentFeeder.LoadedStream:
+        track = TrackId.from_uri("spotify:track:" + spotify_track_id)
+        with self._session_lock:
+            gen, session, content_feeder = self._session_gen, self.session, self.content_feeder
+        try:
+            payload = content_feeder.load(track, quality, False, None)
+            return self._track_session_stream(session, payload)
+        except Exception as e:
+            if isinstance(e, RuntimeError) and str(e) == "Cannot get alternative track":
+                raise StreamerError(str(e)) from e
+            if not self._session_broken(session, e):
+                # Bad track (no audio file, unknown ID, CDN refusal, ...)
+                if isinstance(e, OSError):
+                    raise StreamerError(f"Cannot load track: {e}") from e
+                raise
+            error = e
+        # Expired or dropped session: retry once on a fresh one
+        self._swap_session(gen)
+        with self._session_lock:
+            session, content_feeder = self.session, self.content_feeder
+        try:
+            payload = content_feeder.load(track, quality, False, None)
+        except Exception as e:
+            raise e from error
+        return self._track_session_stream(session, payload)
+
+    def _mp3_cache_lookup(self, spotify_track_id: str) -> Optional[Tuple[str, str, int, int]]:
+        """
+        Returns (path, title, duration, size) of a cached transcode. The
+        quality is fixed, so the track ID alone identifies the file; title
+        and duration live next to it, so a hit needs no track metadata.
+        """
+        if not self.mp3_cache_dir:
+            return None
+        path = os.path.join(self.mp3_cache_dir, spotify_track_id + ".mp3")
+        try:
+            with open(path[:-len(".mp3")] + ".json", "rb") as f:
+                title, duration = json.load(f)
+            size = os.stat(path).st_size
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return (path, title, duration, size)
+
+    def _mp3_cache_store(self, part_path: str, spotify_track_id: str,
+                         title: str, duration: int) -> None:
+        """Moves a finished transcode into the cache (best effort)"""
+        base = os.path.join(self.mp3_cache_dir, spotify_track_id)
+        try:
+            # Metadata first: an .mp3 without its .json is never served
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.mp3_cache_dir, suffix=".part", delete=False
+            ) as f:
+                json.dump([title, duration], f)
+            os.replace(f.name, base + ".json")
+            os.replace(part_path, base + ".mp3")
+        except OSError:
+            return  # e.g. disk full, or the .part was swept as stale
+        self._trim_mp3_cache()
+
+    def _trim_mp3_cache(self) -> None:
+        """
+        Evicts least recently used tracks until the cache fits its budget,
+        and clears .part files abandoned by a crashed transcode
+        """
+        with self._mp3_cache_lock:
+            entries = []
+            total = 0
+            now = time.time()
+            with os.scandir(self.mp3_cache_dir) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                        if entry.name.endswith(".part"):
+                            if now - stat.st_mtime > MP3_CACHE_STALE_PART_AGE:
+                                os.remove(entry.path)
+                            else:
+                                total += stat.st_size  # Transcode in progress
+                        elif entry.name.endswith(".mp3"):
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+                            total += stat.st_size
+                    except FileNotFoundError:
+                        pass  # Removed concurrently
+            for _, size, path in sorted(entries):
+                if total <= self.mp3_cache_size:
+                    break
+                for victim in (path, path[:-len(".mp3")] + ".json"):
+                    try:
+                        os.remove(victim)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+    def generate_stream_file(self, path: str, range_start: int = 0,
+                             range_end: Optional[int] = None) -> Generator[BytesIO, None, None]:
+        """Serves the [range_start, range_end) slice of a cached MP3"""
+
+        def stream():
+            with open(path, 'rb') as f:
+                f.seek(range_start)
+                file_size = os.fstat(f.fileno()).st_size
+                end = min(range_end, file_size) if range_end is not None else file_size
+                remaining = end - range_start
+                while remaining > 0:
+                    out_chunk = f.read(min(self.read_size, remaining))
+                    if not out_chunk:
                         break
-                    ffmpeg_process.stdin.write(in_chunk)
-            except:
-                ffmpeg_process.stdin.close()
-                stream.close()
+                    remaining -= len(out_chunk)
+                    yield out_chunk
+
+        return stream
+
+    def generate_stream(self, load_payload: Callable[[], PlayableContentFeeder.LoadedStream],
+                        bitrate: int, size: int, range_start: int = 0,
+                        range_end: Optional[int] = None,
+                        cache_entry: Optional[Tuple[str, str, int]] = None
+                        ) -> Generator[BytesIO, None, None]:
+        """
+        Converts OGG to MP3 on the fly using FFMPEG, yielding only the
+        [range_start, range_end) slice of the (padded) MP3. With a
+        cache_entry (track ID, title, duration), a transcode that runs to
+        completion is also kept in the MP3 cache.
+        """
 
         def stream():
+            payload = load_payload()
             input_stream = payload.input_stream.stream()
             ffmpeg_process = subprocess.Popen(
-                'ffmpeg -f ogg -i - -vn -b:a {}k -f mp3 -'
-                .format(bitrate).split(),
+                ['ffmpeg', '-f', 'ogg', '-i', '-', '-vn', '-b:a', f'{bitrate}k', '-f', 'mp3', '-'],
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL
+                stderr=subprocess.DEVNULL,
+                start_new_session=True  # Keep terminal signals (Ctrl+C) ours
             )
-            write_t = threading.Thread(target=async_write, args=(ffmpeg_process,input_stream,))
-            write_t.start()
-            transmitted = 0
+            # Bigger pipes mean fewer wakeups between FFmpeg and us
+            utils.grow_pipe(ffmpeg_process.stdin.fileno())
+            utils.grow_pipe(ffmpeg_process.stdout.fileno())
+            output = _pump_ffmpeg(ffmpeg_process, input_stream, self.chunk_size,
+                                  self.read_size)
+            cache_file = None
+            end = min(range_end, size) if range_end is not None else size
+            position = 0  # Offset of the next FFmpeg byte within the MP3
             try:
-                while True:
-                    out_chunk = ffmpeg_process.stdout.read(self.chunk_size)
+                if cache_entry:
+                    # Tee into a temp file, renamed into place only once complete
+                    try:
+                        cache_file = tempfile.NamedTemporaryFile(
+                            dir=self.mp3_cache_dir, suffix='.part', delete=False
+                        )
+                    except OSError:
+                        pass  # Caching is best effort; still serve the stream
+                while position < end:
+                    out_chunk = next(output, b'')
                     if not out_chunk:
-                        if transmitted < size:
-                            yield b'\0' * (size-transmitted)
+                        if cache_file:
+                            # Padded like the response, so every request for
+                            # this track agrees on its size
+                            padding = size - position
+                            try:
+                                while padding > 0:
+                                    n = min(padding, len(ZEROS))
+                                    cache_file.write(ZEROS[:n])
+                                    padding -= n
+                                cache_file.close()
+                            except OSError:
+                                pass  # Left for the finally block to discard
+                            else:
+                                self._mp3_cache_store(cache_file.name, *cache_entry)
+                                cache_file = None
+                        padding = end - max(position, range_start)
+                        while padding > 0:
+                            # Slices of a shared buffer, never one big tail
+                            n = min(padding, len(ZEROS))
+                            yield ZEROS[:n]
+                            padding -= n
                         break
-                    transmitted += len(out_chunk)
-                    yield out_chunk
+                    if cache_file:
+                        try:
+                            cache_file.write(out_chunk)
+                        except OSError:  # e.g. disk full: stop caching only
+                            cache_file.close()
+                            os.remove(cache_file.name)
+                            cache_file = None
+                    chunk_start = position
+                    position += len(out_chunk)
+                    if position <= range_start:
+                        continue  # Seeking: drop bytes before the range
+                    yield out_chunk[max(range_start - chunk_start, 0):end - chunk_start]
             except:
                 pass
             finally:
+                output.close()
+                if cache_file:  # Incomplete transcode, nothing to keep
+                    cache_file.close()
+                    try:
+                        os.remove(cache_file.name)
+                    except FileNotFoundError:
+                        pass
+                # SIGKILL: FFmpeg may spend a while flushing on SIGTERM, and
+                # whatever it would still write is never read anyway
+                ffmpeg_process.kill()
                 if ffmpeg_process.stdin:
                     ffmpeg_process.stdin.close()
                 if ffmpeg_process.stdout:
                     ffmpeg_process.stdout.close()
-                ffmpeg_process.terminate()
-                ffmpeg_process.wait()
+                try:
+                    ffmpeg_process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    pass  # Reaped by a later Popen (subprocess._cleanup)
         return stream
 
-""" Pass-through, streaming in original OGG format
-
     def generate_stream_ogg(
         self,
         content: PlayableContentFeeder.LoadedStream,
-        range_start: int,
-        range_end: int,
+        range_start: int = 0,
+        range_end: Optional[int] = None,
     ) -> Generator[BytesIO, None, None]:
+        """
+        Pass-through, yielding the [range_start, range_end) slice of the
+        original OGG file; seeking only fetches the chunks it needs
+        """
+
         def stream():
-            input_stream = content.input_stream
-            max_chunk = content.input_stream.size / self.chunk_size
-            start_chunk = int(range_start / self.chunk_size)
-            end_chunk = int(range_end / self.chunk_size) if range_end else max_chunk
-            while start_chunk < end_chunk:
-                start = self.chunk_size * start_chunk
-                end = (start_chunk + 1) * self.chunk_size - 1
-                out_chunk = input_stream.request(
-                    range_start=start, range_end=end
-                ).buffer
-                decrypted_chunk = input_stream._Streamer__audio_decrypt.decrypt_chunk(
-                    start_chunk, out_chunk
-                )
-                start_chunk += 1
-                yield decrypted_chunk
+            input_stream = content.input_stream.stream()
+            size = content.input_stream.size - SPOTIFY_OGG_HEADER_SIZE
+            end = min(range_end, size) if range_end is not None else size
+            try:
+                # Offsets are absolute in the stream, header included
+                input_stream.seek(SPOTIFY_OGG_HEADER_SIZE + range_start)
+                remaining = end - range_start
+                while remaining > 0:
+                    out_chunk = input_stream.read(min(self.chunk_size, remaining))
+                    if not out_chunk:
+                        break
+                    remaining -= len(out_chunk)
+                    yield out_chunk
+            finally:
+                input_stream.close()
 
         return stream
-"""
@@ -1,12 +1,56 @@
 
-from urllib.parse import urlparse,urlunparse,urlencode
+from urllib.parse import urlparse,urlencode,quote_plus
+from typing import Optional, Tuple
 
 import flask
 
+from streamers.exceptions import RangeNotSatisfiableError
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Kept moderate: pipe buffers count against fs.pipe-user-pages-soft (64 MiB
+# per user by default), and every stream opens two of them
+PIPE_SIZE = 256 * 1024
+
 def construct_url(path: str, scheme: str = 'http', **qargs):
-    (_, netloc, _, _, _, _) = urlparse(flask.request.url_root)
-    query_params = urlencode(qargs)
-    return urlunparse((scheme,netloc, path, _, query_params, _))
+    # Parsed once per request, not once per search result
+    netloc = flask.g.get('_netloc')
+    if netloc is None:
+        netloc = flask.g._netloc = urlparse(flask.request.url_root).netloc
+    if len(qargs) == 1:
+        ((key, value),) = qargs.items()
+        query_params = f"{quote_plus(key)}={quote_plus(str(value))}"
+    else:
+        query_params = urlencode(qargs)
+    return f"{scheme}://{netloc}{path}?{query_params}"
+
+def grow_pipe(fd: int, size: int = PIPE_SIZE) -> None:
+    """Best effort: enlarge a pipe's kernel buffer (Linux only)."""
+    if fcntl is None or not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, size)
+    except OSError:
+        pass  # e.g. above /proc/sys/fs/pipe-max-size
+
+def resolve_range(range_start: int, range_end: Optional[int], size: int) -> Tuple[int, int]:
+    """
+    Resolves a parsed Range against the resource size into [start, end).
+    A negative range_start is a suffix range: the last -range_start bytes.
+    """
+    if range_start < 0:
+        range_start, range_end = max(size + range_start, 0), None
+    range_end = size if range_end is None else min(range_end, size)
+    if range_start >= range_end:
+        raise RangeNotSatisfiableError(size)
+    return range_start, range_end
 
-def estimate_size(duration: int, bitrate: int, offset: int = 20000) -> int:
-    return (duration * bitrate * 125) + offset
\ No newline at end of file
+def estimate_size(duration_ms: int, bitrate: int, offset: int = 4096) -> int:
+    """
+    CBR MP3 size for a track: the audio itself (kbps * ms / 8) plus room
+    for FFmpeg's ID3v2 tag, the Xing/LAME info frame and encoder padding
+    """
+    return (duration_ms * bitrate // 8) + offset
\ No newline at end of file